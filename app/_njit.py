@@ -0,0 +1,11 @@
+# numba 為選用依賴：未安裝時 njit 退化為原函數，呼叫端依 NUMBA_AVAILABLE 選擇實作
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
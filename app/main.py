@@ -1,28 +1,54 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from pathlib import Path
+import backtesting
 from backtesting import Backtest
 import pandas as pd
 import yfinance as yf
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-import traceback
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import atexit
 import numpy as np
+import orjson
 import math
 import os
-
-if not hasattr(pd.Series, 'iteritems'):
-    pd.Series.iteritems = pd.Series.items
-if not hasattr(np, 'float'):
-    np.float = float
+import time
+import uuid
+import re
 
 from .strategy import UniversalStrategy
-from .schemas import BacktestRequest, BacktestResponse
-
-app = FastAPI()
+from .schemas import BaseBacktestRequest, BacktestRequest, BacktestResponse, OptimizeRequest, OptimizeResponse
+
+# 日誌先進佇列，由背景執行緒寫出，請求執行緒不直接做同步 stdout I/O
+# 只設定本套件的 "app" logger，不影響 root 與其他函式庫的日誌層級
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_app_logger = logging.getLogger("app")
+_app_logger.setLevel(logging.INFO)
+_app_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_app_logger.propagate = False
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logger = logging.getLogger(__name__)
+
+class ORJSONResponse(JSONResponse):
+    """ 以 orjson 序列化回應，大量曲線資料時比標準 json 快 """
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(default_response_class=ORJSONResponse)
+# 回測結果 JSON 重複性高，壓縮後傳輸量大幅下降
+app.add_middleware(GZipMiddleware, minimum_size=2048)
 
 # 設定路徑
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,7 +58,29 @@ DATA_DIR = BASE_DIR / "data"
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# 下載資料的磁碟快取有效期限 (秒)
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# 曲線點數超過門檻時抽樣至約 MAX_CHART_POINTS 點 (圖表寬度有限)
+DOWNSAMPLE_THRESHOLD = 1500
+MAX_CHART_POINTS = 1200
+
+# 參數最佳化的組合數上限
+MAX_OPTIMIZE_COMBINATIONS = 2500
+# 網格搜尋專用單一執行緒：Backtesting 每次最佳化都會建立一整個行程池，同時間只允許一個
+OPTIMIZE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="optimize")
+# Backtesting 在 Linux 預設以 fork 建立行程池，但伺服器行程內已有事件迴圈、下載與日誌執行緒，
+# fork 多執行緒行程可能讓子行程死結；改用 spawn 啟動全新的工作行程
+backtesting.Pool = multiprocessing.get_context("spawn").Pool
+
+# Yahoo 下載專用執行緒池，限制同時連線數
+YF_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="yf")
+# 進行中的下載 (ticker, start, end) -> Future，相同請求共用同一次下載
+_inflight_downloads = {}
+
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+# 儀表板模板不含任何請求相關變數，啟動時渲染一次即可重複使用
+DASHBOARD_HTML = templates.get_template("dashboard.html").render()
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 def safe_num(value, decimal=2):
@@ -43,53 +91,108 @@ def safe_num(value, decimal=2):
     except Exception:
         return 0.0
 
+def safe_array(values, decimal=2):
+    """ safe_num 的向量化版本：一次處理整個陣列，NaN/inf 轉為 0 """
+    arr = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(arr), np.round(arr, decimal), 0.0)
+
+def values_at(values, idx, decimal=2):
+    """ 以 fancy indexing 一次取出多個 bar 的指標值，超出範圍者為 0 """
+    arr = np.asarray(values, dtype=np.float64)
+    idx = np.asarray(idx, dtype=np.int64)
+    if len(arr) == 0: return np.zeros(len(idx))
+    picked = arr[np.clip(idx, 0, len(arr) - 1)]
+    return safe_array(np.where(idx < len(arr), picked, 0.0), decimal)
+
+def downsample_indices(n):
+    """ 均勻抽樣約 MAX_CHART_POINTS 個索引 (含首尾)；只取決於 n，同一區間每次結果相同；不需抽樣時回傳 None """
+    if n <= DOWNSAMPLE_THRESHOLD: return None
+    return np.unique(np.linspace(0, n - 1, MAX_CHART_POINTS).round().astype(np.int64))
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    print(f"[CRITICAL ERROR] {str(exc)}")
-    traceback.print_exc()
+    logger.error("[CRITICAL ERROR] %s", exc, exc_info=exc)
     return JSONResponse(status_code=500, content={"detail": f"Server Error: {str(exc)}"})
 
+def _clean_yahoo_frame(df):
+    """ 將 yfinance 原始資料整理為標準 OHLCV 格式，缺欄位時回傳 None """
+    if isinstance(df.columns, pd.MultiIndex): 
+        df.columns = df.columns.get_level_values(0)
+    
+    df.columns = [c if isinstance(c, str) else c[0] for c in df.columns]
+
+    if df.index.tz is not None: df.index = df.index.tz_localize(None)
+    if 'Adj Close' in df.columns and 'Close' not in df.columns: df = df.rename(columns={'Adj Close': 'Close'})
+    
+    required = ['Open', 'High', 'Low', 'Close', 'Volume']
+    if not all(col in df.columns for col in required): return None
+    
+    # 只保留 OHLCV 並合併為單一 float64 區塊 (Backtesting 不接受 Arrow 欄位)
+    return df[required].astype(np.float64).ffill().bfill()
+
+def _write_atomic(path, write):
+    """ 先以 write(暫存路徑) 寫入同目錄暫存檔再改名，讀取端與並行寫入都不會看到殘缺內容 """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
 @lru_cache(maxsize=64)
 def _download_from_yahoo(ticker: str, start: str, end: str):
-    print(f"[YFinance] 下載: {ticker}")
+    # 先查磁碟快取 (Parquet)，快取內已是清洗後的資料，未過期則直接讀取
+    cache_path = DATA_DIR / f"{ticker}_{start}_{end}.parquet"
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < CACHE_TTL_SECONDS:
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception as e:
+            # 無法讀取的快取視同未命中，刪除後重新下載
+            logger.warning("[Cache] 讀取失敗，重新下載: %s", e)
+            cache_path.unlink(missing_ok=True)
+
+    logger.debug("[YFinance] 下載: %s", ticker)
     try:
-        return yf.download(ticker, start=start, end=end, progress=False, auto_adjust=True)
+        df = yf.download(ticker, start=start, end=end, progress=False, auto_adjust=True)
     except Exception:
         return pd.DataFrame()
+    if df is None or df.empty: return pd.DataFrame()
+
+    df = _clean_yahoo_frame(df)
+    if df is None: return pd.DataFrame()
 
-async def get_yfinance_data(ticker: str, start: str, end: str):
+    try:
+        _write_atomic(cache_path, lambda tmp: df.to_parquet(tmp, compression="zstd"))
+    except Exception as e:
+        logger.warning("[Cache] 寫入失敗: %s", e)
+    return df
+
+async def get_yfinance_data(ticker: str, start, end):
     ticker = ticker.upper().strip()
     if ticker.isdigit() or (len(ticker) == 4 and ticker.isdigit()): ticker += ".TW"
+    # 代碼與日期會組成快取檔名，先檢查字元並統一日期格式 (YYYY-MM-DD)
+    if not re.fullmatch(r"[A-Z0-9^=\-]+(\.[A-Z0-9^=\-]+)*", ticker): return None, ticker
     
     loop = asyncio.get_event_loop()
     try:
-        df = await loop.run_in_executor(None, _download_from_yahoo, ticker, start, end)
+        start = pd.Timestamp(start).strftime("%Y-%m-%d")
+        end = pd.Timestamp(end).strftime("%Y-%m-%d")
+        key = (ticker, start, end)
+        fut = _inflight_downloads.get(key)
+        if fut is None:
+            fut = loop.run_in_executor(YF_EXECUTOR, _download_from_yahoo, ticker, start, end)
+            _inflight_downloads[key] = fut
+            fut.add_done_callback(lambda _: _inflight_downloads.pop(key, None))
+        df = await asyncio.shield(fut)
         if df is None or df.empty: return None, ticker
-        
-        if isinstance(df.columns, pd.MultiIndex): 
-            df.columns = df.columns.get_level_values(0)
-        
-        df.columns = [c if isinstance(c, str) else c[0] for c in df.columns]
-
-        if df.index.tz is not None: df.index = df.index.tz_localize(None)
-        if 'Adj Close' in df.columns and 'Close' not in df.columns: df.rename(columns={'Adj Close': 'Close'}, inplace=True)
-        
-        required = ['Open', 'High', 'Low', 'Close', 'Volume']
-        if not all(col in df.columns for col in required): return None, ticker
-        
-        df = df.ffill().bfill()
-        
-        csv_path = DATA_DIR / f"{ticker}.csv"
-        df.to_csv(csv_path)
-        
         return df, ticker
     except Exception as e:
-        print(f"數據處理錯誤: {e}")
+        logger.warning("數據處理錯誤: %s", e)
         return None, ticker
 
-@app.get("/")
-def read_root(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+@app.get("/", response_class=HTMLResponse)
+def read_root():
+    return HTMLResponse(DASHBOARD_HTML)
 
 def get_indicator_note(strategy, strat_name, strat_params, idx):
     if not strat_name: return ""
@@ -173,7 +276,7 @@ def shutdown_event():
     import psutil
     
     def kill():
-        print("使用者請求關閉系統，正在終止伺服器...")
+        logger.info("使用者請求關閉系統，正在終止伺服器...")
         time.sleep(0.5)
         
         try:
@@ -184,24 +287,36 @@ def shutdown_event():
             
             # 如果有父進程，先殺父進程
             if parent:
-                print(f"正在結束主程序 (PID: {parent.pid})...")
+                logger.info("正在結束主程序 (PID: %s)...", parent.pid)
                 parent.terminate()
         except Exception as e:
-            print(f"關閉主程序時發生錯誤: {e}")
+            logger.warning("關閉主程序時發生錯誤: %s", e)
 
-        # 最後強制結束自己
+        # 最後強制結束自己 (os._exit 不會執行 atexit，先把佇列中的日誌寫完)
+        _log_listener.stop()
         os._exit(0)
         
     threading.Thread(target=kill).start()
     return {"message": "系統正在關閉..."}
 
-@app.post("/api/backtest", response_model=BacktestResponse)
-async def run_backtest(params: BacktestRequest):
+def _write_csv(df, path):
+    _write_atomic(path, df.to_csv)
+
+def _log_csv_result(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("[CSV] 寫入失敗: %s", fut.exception())
+
+async def load_backtest_data(params: BaseBacktestRequest):
     df, real_ticker = await get_yfinance_data(params.ticker, params.start_date, params.end_date)
     
     if df is None or df.empty:
         raise HTTPException(status_code=404, detail="找不到數據")
 
+    # 選用：另存 CSV 供人工檢視，於背景執行緒寫入不阻塞回應
+    if params.save_csv:
+        fut = asyncio.get_event_loop().run_in_executor(None, _write_csv, df, DATA_DIR / f"{real_ticker}.csv")
+        fut.add_done_callback(_log_csv_result)
+
     min_bars = 60
     if len(df) < min_bars:
         raise HTTPException(status_code=400, detail=f"數據不足 {min_bars} 筆")
@@ -214,6 +329,12 @@ async def run_backtest(params: BacktestRequest):
     if len(df) < min_bars:
         raise HTTPException(status_code=400, detail=f"有效數據不足 {min_bars} 筆 (含空值)")
 
+    return df, real_ticker
+
+@app.post("/api/backtest", response_model=BacktestResponse)
+async def run_backtest(params: BacktestRequest):
+    df, real_ticker = await load_backtest_data(params)
+
     # 計算手續費率 (Backtesting 僅支援單一費率，故取平均)
     # 若為定期定額模式，因我們將在 Strategy 中手動扣除定額手續費，故將 Backtest 手續費設為 0
     if params.strategy_mode == 'periodic':
@@ -270,6 +391,8 @@ async def run_backtest(params: BacktestRequest):
 
     
     stats = bt.run(**strat_kwargs)
+    # 結果 Series 轉成一般 dict，之後的欄位查詢不再經過 pandas 索引
+    s = stats.to_dict()
 
     # --- 修正報酬率計算 (針對定期定額) & 產生 ROI 曲線 ---
     invested_series = []
@@ -295,26 +418,28 @@ async def run_backtest(params: BacktestRequest):
         invested_series = [params.cash] * len(df)
     
     total_invested = invested_series[-1] if invested_series else params.cash
-    final_equity = stats["Equity Final [$]"]
+    final_equity = s["Equity Final [$]"]
     
     # 重新計算總報酬率
     adjusted_return = ((final_equity - total_invested) / total_invested) * 100
     
-    equity_curve = stats._equity_curve
+    equity_curve = s["_equity_curve"]
+
+    # 日期字串只轉換一次 (equity_curve 與 df 共用相同索引)
+    times = df.index.strftime("%Y-%m-%d").tolist()
 
     # 準備 ROI 曲線數據 (時間序列)
-    roi_list = []
+    roi_list = {"times": [], "values": []}
     if not equity_curve.empty and len(equity_curve) == len(invested_series):
         roi_vals = (equity_curve['Equity'] - invested_series) / invested_series * 100
-        roi_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(equity_curve.index, roi_vals)]
+        roi_list = {"times": times, "values": safe_array(roi_vals).tolist()}
     else:
-        roi_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num((v - params.cash)/params.cash*100)} for t, v in zip(equity_curve.index, equity_curve['Equity'])]
+        roi_vals = (equity_curve['Equity'] - params.cash) / params.cash * 100
+        roi_list = {"times": times, "values": safe_array(roi_vals).tolist()}
 
-    equity_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(equity_curve.index, equity_curve['Equity'])]
-    
     # B&H Logic...
-    trades_df = stats._trades
-    strategy = stats._strategy
+    trades_df = s["_trades"]
+    strategy = s["_strategy"]
 
     extra_trades = []
     if params.strategy_mode == 'periodic' and hasattr(strategy, 'order_log'):
@@ -331,12 +456,12 @@ async def run_backtest(params: BacktestRequest):
     winning_trades = len(trades_df[trades_df['PnL'] > 0]) if not trades_df.empty else 0
 
     # 計算水下曲線
-    drawdown_list = []
+    drawdown_list = {"times": [], "values": []}
     if not equity_curve.empty:
         equity_series = equity_curve['Equity']
         running_max = equity_series.cummax()
         drawdown_series = (equity_series - running_max) / running_max * 100
-        drawdown_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(drawdown_series.index, drawdown_series)]
+        drawdown_list = {"times": times, "values": safe_array(drawdown_series).tolist()}
 
     # 計算損益分佈直方圖 (PnL Histogram)
     pnl_hist_data = {"labels": [], "values": [], "colors": []}
@@ -355,43 +480,57 @@ async def run_backtest(params: BacktestRequest):
                 pnl_hist_data["values"].append(int(counts[i]))
                 pnl_hist_data["colors"].append(color)
 
+    # 曲線以平行陣列 {"times": [...], "values": [...]} 回傳，避免逐點建立 dict
+    close = df['Close'].to_numpy(np.float64)
+
     # 準備 B&H 曲線
-    bh_list = []
-    if len(df) > 0:
-        first = df['Close'].iloc[0]
-        if first > 0:
-            bh_vals = (df['Close'] / first) * params.cash
-            bh_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(bh_vals.index, bh_vals)]
-            
-    equity_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(equity_curve.index, equity_curve['Equity'])]
-    price_list = [{"time": t.strftime("%Y-%m-%d"), "value": safe_num(v)} for t, v in zip(df.index, df['Close'])]
+    bh_list = {"times": [], "values": []}
+    if len(close) > 0 and close[0] > 0:
+        bh_list = {"times": times, "values": safe_array(close / close[0] * params.cash).tolist()}
+
+    equity_list = {"times": times, "values": safe_array(equity_curve['Equity']).tolist()}
+    price_list = {"times": times, "values": safe_array(close).tolist()}
     
     detailed_trades = []
     chart_trades = []
     
-    max_consecutive_loss = 0
-    current_loss = 0
-
     if not trades_df.empty:
-        for i, row in trades_df.iterrows():
-            e_idx, x_idx = int(row['EntryBar']), int(row['ExitBar'])
+        # 交易欄位一次取出並清洗，迴圈內以位置索引
+        entry_bar_arr = trades_df['EntryBar'].to_numpy(np.int64)
+        exit_bar_arr = trades_df['ExitBar'].to_numpy(np.int64)
+        entry_bars = entry_bar_arr.tolist()
+        exit_bars = exit_bar_arr.tolist()
+        entry_times = trades_df['EntryTime'].dt.strftime("%Y-%m-%d").tolist()
+        exit_times = trades_df['ExitTime'].dt.strftime("%Y-%m-%d").tolist()
+        sizes = np.abs(trades_df['Size'].to_numpy()).astype(np.int64).tolist()
+        entry_prices = safe_array(trades_df['EntryPrice']).tolist()
+        exit_prices = safe_array(trades_df['ExitPrice']).tolist()
+        pnls = safe_array(trades_df['PnL'], 0).tolist()
+        return_pcts = safe_array(trades_df['ReturnPct'] * 100).tolist()
+
+        # 基礎模式：進出場 bar 的 SMA/RSI 一次取出
+        basic_notes_ready = False
+        if params.strategy_mode == 'basic':
+            try:
+                e_rsis = values_at(strategy.rsi_entry, entry_bar_arr).tolist()
+                e_sma1s = values_at(strategy.sma1, entry_bar_arr).tolist()
+                e_sma2s = values_at(strategy.sma2, entry_bar_arr).tolist()
+                x_rsis = values_at(strategy.rsi_exit, exit_bar_arr).tolist()
+                x_sma1s = values_at(strategy.sma1, exit_bar_arr).tolist()
+                x_sma2s = values_at(strategy.sma2, exit_bar_arr).tolist()
+                basic_notes_ready = True
+            except Exception: pass
+
+        for pos in range(len(trades_df)):
+            e_idx, x_idx = entry_bars[pos], exit_bars[pos]
             
             entry_note = ""
             exit_note = ""
 
             if params.strategy_mode == 'basic':
-                try:
-                    e_rsi = safe_num(strategy.rsi_entry[e_idx]) if len(strategy.rsi_entry) > e_idx else 0
-                    e_sma1 = safe_num(strategy.sma1[e_idx]) if len(strategy.sma1) > e_idx else 0
-                    e_sma2 = safe_num(strategy.sma2[e_idx]) if len(strategy.sma2) > e_idx else 0
-                    
-                    x_rsi = safe_num(strategy.rsi_exit[x_idx]) if len(strategy.rsi_exit) > x_idx else 0
-                    x_sma1 = safe_num(strategy.sma1[x_idx]) if len(strategy.sma1) > x_idx else 0
-                    x_sma2 = safe_num(strategy.sma2[x_idx]) if len(strategy.sma2) > x_idx else 0
-                    
-                    entry_note = f"SMA: {e_sma1}/{e_sma2} | RSI: {e_rsi}"
-                    exit_note = f"SMA: {x_sma1}/{x_sma2} | RSI: {x_rsi}"
-                except: pass
+                if basic_notes_ready:
+                    entry_note = f"SMA: {e_sma1s[pos]}/{e_sma2s[pos]} | RSI: {e_rsis[pos]}"
+                    exit_note = f"SMA: {x_sma1s[pos]}/{x_sma2s[pos]} | RSI: {x_rsis[pos]}"
             
             elif params.strategy_mode == 'periodic':
                 entry_note = "定期定額買入"
@@ -414,25 +553,27 @@ async def run_backtest(params: BacktestRequest):
 
 
             detailed_trades.append({
-                "entry_date": row['EntryTime'].strftime("%Y-%m-%d"),
-                "exit_date": row['ExitTime'].strftime("%Y-%m-%d"),
-                "entry_price": safe_num(row['EntryPrice']),
-                "exit_price": safe_num(row['ExitPrice']),
-                "size": int(abs(row['Size'])),
-                "pnl": safe_num(row['PnL'], 0),
-                "return_pct": safe_num(row['ReturnPct'] * 100),
+                "entry_date": entry_times[pos],
+                "exit_date": exit_times[pos],
+                "entry_price": entry_prices[pos],
+                "exit_price": exit_prices[pos],
+                "size": sizes[pos],
+                "pnl": pnls[pos],
+                "return_pct": return_pcts[pos],
                 "entry_note": entry_note, 
                 "exit_note": exit_note
             })
 
-            chart_trades.append({"time": row['EntryTime'].strftime("%Y-%m-%d"), "price": safe_num(row['EntryPrice']), "type": "buy"})
-            chart_trades.append({"time": row['ExitTime'].strftime("%Y-%m-%d"), "price": safe_num(row['ExitPrice']), "type": "sell"})
+            chart_trades.append({"time": entry_times[pos], "price": entry_prices[pos], "type": "buy"})
+            chart_trades.append({"time": exit_times[pos], "price": exit_prices[pos], "type": "sell"})
 
-            if row['PnL'] < 0:
-                current_loss += 1
-                max_consecutive_loss = max(max_consecutive_loss, current_loss)
-            else:
-                current_loss = 0
+    # 最大連續虧損次數：以 run-length 計算連續虧損區段長度
+    max_consecutive_loss = 0
+    if not trades_df.empty:
+        losses = (trades_df['PnL'].to_numpy() < 0).astype(np.int32)
+        run_starts = np.flatnonzero(np.r_[1, np.diff(losses)])
+        run_lengths = np.diff(np.r_[run_starts, len(losses)])
+        max_consecutive_loss = int(run_lengths[losses[run_starts] == 1].max(initial=0))
 
     if extra_trades:
         chart_trades.extend(extra_trades)
@@ -457,30 +598,56 @@ async def run_backtest(params: BacktestRequest):
     if not equity_curve.empty:
         eq_df = pd.DataFrame(equity_curve['Equity'])
         m_df = eq_df.resample('ME').last() if hasattr(eq_df, 'resample') else eq_df
-        m_df['Return'] = m_df['Equity'].pct_change() * 100
-        for date, row in m_df.iterrows():
-            if not (pd.isna(row['Return']) or np.isinf(row['Return'])):
-                if date.year not in heatmap_data: heatmap_data[date.year] = {}
-                heatmap_data[date.year][date.month] = safe_num(row['Return'])
-
-
-    lump_sum_bh_return_pct = stats["Buy & Hold Return [%]"]
+        ret = m_df['Equity'].pct_change().to_numpy() * 100
+        mask = np.isfinite(ret)
+        years = m_df.index.year.to_numpy()[mask].tolist()
+        months = m_df.index.month.to_numpy()[mask].tolist()
+        for y, mo, r in zip(years, months, np.round(ret[mask], 2).tolist()):
+            heatmap_data.setdefault(y, {})[mo] = r
+
+
+    # 長區間曲線抽樣：抽樣點只取決於資料長度，鎖定策略時各次回測的日期標籤才能對齊
+    sel = downsample_indices(len(times))
+    if sel is not None:
+        sel_list = sel.tolist()
+        sampled_times = [times[i] for i in sel_list]
+        for curve in (equity_list, roi_list, price_list, bh_list):
+            if len(curve["values"]) == len(times):
+                curve["times"] = sampled_times
+                curve["values"] = [curve["values"][i] for i in sel_list]
+
+        # 回撤圖不參與鎖定比較，另外保留最深回撤點，圖上谷底才會與最大回撤一致
+        if len(drawdown_list["values"]) == len(times):
+            dd_sel = np.union1d(sel, [int(np.argmin(drawdown_list["values"]))]).tolist()
+            drawdown_list = {"times": [times[i] for i in dd_sel],
+                             "values": [drawdown_list["values"][i] for i in dd_sel]}
+
+        # 買賣標記對齊到最近的抽樣日期，否則前端查表時找不到對應標籤
+        if chart_trades:
+            bars = np.searchsorted(np.asarray(times), [t["time"] for t in chart_trades])
+            right = np.clip(np.searchsorted(sel, bars), 0, len(sel) - 1)
+            left = np.clip(right - 1, 0, len(sel) - 1)
+            nearest = np.where(np.abs(sel[left] - bars) <= np.abs(sel[right] - bars), sel[left], sel[right])
+            for t, i in zip(chart_trades, nearest.tolist()):
+                t["time"] = times[i]
+
+    lump_sum_bh_return_pct = s["Buy & Hold Return [%]"]
 
     return {
         "ticker": real_ticker,
-        "final_equity": safe_num(stats["Equity Final [$]"], 0),
+        "final_equity": safe_num(s["Equity Final [$]"], 0),
         "total_invested": safe_num(total_invested), 
         "total_return": safe_num(adjusted_return),
-        "annual_return": safe_num(stats["Return (Ann.) [%]"]),
+        "annual_return": safe_num(s["Return (Ann.) [%]"]),
         "buy_and_hold_return": safe_num(lump_sum_bh_return_pct), 
-        "win_rate": safe_num(stats["Win Rate [%]"]),
+        "win_rate": safe_num(s["Win Rate [%]"]),
         "winning_trades": winning_trades,
-        "profit_factor": safe_num(stats.get("Profit Factor", 0)),
-        "total_trades": int(stats["# Trades"]),
+        "profit_factor": safe_num(s.get("Profit Factor", 0)),
+        "total_trades": int(s["# Trades"]),
         "avg_pnl": safe_num(trades_df['PnL'].mean(), 0) if not trades_df.empty else 0,
         "max_consecutive_loss": max_consecutive_loss,
-        "max_drawdown": safe_num(stats["Max. Drawdown [%]"]),
-        "sharpe_ratio": safe_num(stats["Sharpe Ratio"]),
+        "max_drawdown": safe_num(s["Max. Drawdown [%]"]),
+        "sharpe_ratio": safe_num(s["Sharpe Ratio"]),
         "equity_curve": equity_list,
         "roi_curve": roi_list,
         "drawdown_curve": drawdown_list,
@@ -490,4 +657,74 @@ async def run_backtest(params: BacktestRequest):
         "heatmap_data": heatmap_data,
         "buy_and_hold_curve": bh_list,
         "detailed_trades": detailed_trades
-    }
\ No newline at end of file
+    }
+
+def _optimize_basic(df, params: OptimizeRequest):
+    bt = Backtest(
+        df, 
+        UniversalStrategy, 
+        cash=params.cash, 
+        commission=((params.buy_fee_pct + params.sell_fee_pct)/2)/100,
+        exclusive_orders=True
+    )
+    return bt.optimize(
+        n1=range(params.ma_short_min, params.ma_short_max + 1, params.ma_short_step),
+        n2=range(params.ma_long_min, params.ma_long_max + 1, params.ma_long_step),
+        constraint=lambda p: p.n1 < p.n2,
+        maximize=params.maximize,
+        return_heatmap=True,
+        mode='basic',
+        sl_pct=params.stop_loss_pct,
+        tp_pct=params.take_profit_pct,
+        trailing_stop_pct=params.trailing_stop_pct,
+        n_rsi_entry=params.rsi_period_entry,
+        rsi_buy_threshold=params.rsi_buy_threshold,
+        n_rsi_exit=params.rsi_period_exit,
+        rsi_sell_threshold=params.rsi_sell_threshold,
+        commission_rate=((params.buy_fee_pct + params.sell_fee_pct)/2)/100
+    )
+
+@app.post("/api/optimize", response_model=OptimizeResponse)
+async def run_optimize(params: OptimizeRequest):
+    """ 基礎模式均線參數網格搜尋，回傳最佳參數與 (短均線 x 長均線) 熱力圖 """
+    short_range = range(params.ma_short_min, params.ma_short_max + 1, params.ma_short_step)
+    long_range = range(params.ma_long_min, params.ma_long_max + 1, params.ma_long_step)
+    if len(short_range) == 0 or len(long_range) == 0:
+        raise HTTPException(status_code=400, detail="參數範圍無效")
+    if len(short_range) * len(long_range) > MAX_OPTIMIZE_COMBINATIONS:
+        raise HTTPException(status_code=400, detail=f"參數組合過多 (上限 {MAX_OPTIMIZE_COMBINATIONS} 組)")
+    if short_range[0] >= long_range[-1]:
+        raise HTTPException(status_code=400, detail="沒有符合 短均線 < 長均線 的參數組合")
+
+    df, real_ticker = await load_backtest_data(params)
+    if params.ma_long_min >= len(df):
+        raise HTTPException(status_code=400, detail=f"長均線最小值須小於資料筆數 ({len(df)})")
+
+    # 網格搜尋耗時較長，移到專用執行緒執行以免阻塞事件迴圈；並行請求依序排隊
+    loop = asyncio.get_event_loop()
+    stats, heatmap = await loop.run_in_executor(OPTIMIZE_EXECUTOR, _optimize_basic, df, params)
+    grid = heatmap.groupby(level=['n1', 'n2']).max().unstack('n2')
+    values = grid.to_numpy(np.float64)
+    if not np.isfinite(values).any():
+        raise HTTPException(status_code=400, detail=f"所有參數組合的 {params.maximize} 皆無法計算 (可能沒有任何交易)")
+
+    s = stats.to_dict()
+    best = s["_strategy"]
+    # 不成立的組合 (短均線 >= 長均線) 為 null；成立但指標無法計算 (如無交易的夏普值) 依 safe_num 慣例為 0
+    invalid = grid.index.to_numpy()[:, None] >= grid.columns.to_numpy()[None, :]
+    return {
+        "ticker": real_ticker,
+        "maximize": params.maximize,
+        "best_ma_short": int(best.n1),
+        "best_ma_long": int(best.n2),
+        "best_value": safe_num(s[params.maximize]),
+        "total_return": safe_num(s["Return [%]"]),
+        "sharpe_ratio": safe_num(s["Sharpe Ratio"]),
+        "max_drawdown": safe_num(s["Max. Drawdown [%]"]),
+        "total_trades": int(s["# Trades"]),
+        "heatmap": {
+            "ma_short": grid.index.astype(int).tolist(),
+            "ma_long": grid.columns.astype(int).tolist(),
+            "values": np.where(invalid, None, safe_array(values, 4)).tolist()
+        }
+    }
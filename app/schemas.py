@@ -1,16 +1,29 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Dict, Optional, Any, Literal
+from datetime import date
 
-class BacktestRequest(BaseModel):
+# 回測與參數最佳化共用的欄位：標的、期間、資金、交易成本、RSI 與停損停利
+class BaseBacktestRequest(BaseModel):
     ticker: str
-    start_date: str
-    end_date: str
+    start_date: date
+    end_date: date
     cash: float = Field(default=100000, gt=0, description="Initial cash")
+    save_csv: bool = Field(default=False, description="Also save downloaded data to data/{ticker}.csv")
     
     # --- 交易成本 ---
     buy_fee_pct: float = Field(default=0.1425, ge=0, le=10, description="Buy fee percentage")
     sell_fee_pct: float = Field(default=0.4425, ge=0, le=10, description="Sell fee percentage")
-    
+
+    # --- RSI 與停損停利 ---
+    rsi_period_entry: int = 14    
+    rsi_buy_threshold: int = 70   
+    rsi_period_exit: int = 14     
+    rsi_sell_threshold: int = 80  
+    stop_loss_pct: float = 0.0
+    take_profit_pct: float = 0.0
+    trailing_stop_pct: float = 0.0 
+
+class BacktestRequest(BaseBacktestRequest):
     # --- 模式選擇 ---
     strategy_mode: str = "basic" 
 
@@ -22,13 +35,6 @@ class BacktestRequest(BaseModel):
     # --- 基礎模式參數 ---
     ma_short: int = 10
     ma_long: int = 60
-    rsi_period_entry: int = 14    
-    rsi_buy_threshold: int = 70   
-    rsi_period_exit: int = 14     
-    rsi_sell_threshold: int = 80  
-    stop_loss_pct: float = 0.0
-    take_profit_pct: float = 0.0
-    trailing_stop_pct: float = 0.0 
 
     # --- 進階模式參數 ---
     entry_strategy_1: Optional[str] = None
@@ -60,11 +66,39 @@ class BacktestResponse(BaseModel):
     profit_factor: float
 
     pnl_histogram: Dict[str, List] 
-    equity_curve: List[Dict]
-    roi_curve: List[Dict] 
-    drawdown_curve: List[Dict]
-    price_data: List[Dict]
+    # 曲線格式: {"times": [...], "values": [...]}
+    equity_curve: Dict[str, List]
+    roi_curve: Dict[str, List] 
+    drawdown_curve: Dict[str, List]
+    price_data: Dict[str, List]
     trades: List[Dict]
     detailed_trades: Optional[List[Dict]] = [] 
     heatmap_data: Dict[int, Dict[int, float]]
-    buy_and_hold_curve: List[Dict]
\ No newline at end of file
+    buy_and_hold_curve: Dict[str, List]
+
+class OptimizeRequest(BaseBacktestRequest):
+    # 只支援基礎模式；其他模式或單次回測的欄位直接拒絕，而不是默默忽略
+    model_config = ConfigDict(extra="forbid")
+
+    # --- 均線網格範圍 (基礎模式) ---
+    ma_short_min: int = Field(default=5, ge=1)
+    ma_short_max: int = Field(default=30, ge=1)
+    ma_short_step: int = Field(default=5, ge=1)
+    ma_long_min: int = Field(default=20, ge=2)
+    ma_long_max: int = Field(default=120, ge=2)
+    ma_long_step: int = Field(default=10, ge=1)
+
+    maximize: Literal["Sharpe Ratio", "Return [%]", "Equity Final [$]", "Win Rate [%]", "Profit Factor"] = "Sharpe Ratio"
+
+class OptimizeResponse(BaseModel):
+    ticker: str
+    maximize: str
+    best_ma_short: int
+    best_ma_long: int
+    best_value: float
+    total_return: float
+    sharpe_ratio: float
+    max_drawdown: float
+    total_trades: int
+    # 熱力圖格式: {"ma_short": [...], "ma_long": [...], "values": [[...], ...]}
+    heatmap: Dict[str, List]
@@ -2,16 +2,82 @@ from backtesting import Strategy
 from backtesting.lib import crossover
 import pandas as pd
 import numpy as np
+import logging
+from ._njit import njit, NUMBA_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+#  編譯版指標核心 (需安裝 numba)
+# ==========================================
+@njit(cache=True)
+def _sma_loop(close, n):
+    """ 單次掃描的滑動視窗平均，步驟與 pandas rolling().mean() 相同 (先移除再加入、Kahan 補償)，結果逐位一致 """
+    out = np.full(len(close), np.nan)
+    if n <= 0: return out
+    nobs = 0
+    total = 0.0
+    comp_add = 0.0
+    comp_remove = 0.0
+    same_count = 0
+    prev = close[0] if len(close) > 0 else np.nan
+    for i in range(len(close)):
+        if i >= n:
+            val = close[i - n]
+            if val == val:
+                nobs -= 1
+                y = -val - comp_remove
+                t = total + y
+                comp_remove = t - total - y
+                total = t
+        val = close[i]
+        if val == val:
+            nobs += 1
+            y = val - comp_add
+            t = total + y
+            comp_add = t - total - y
+            total = t
+            same_count = same_count + 1 if val == prev else 1
+            prev = val
+        if nobs >= n:
+            # 視窗內皆為同一價格時直接回傳該價格 (與 pandas 相同)
+            out[i] = prev if same_count >= nobs else total / nobs
+    return out
+
+@njit(cache=True)
+def _rsi_loop(close, n):
+    """ Wilder 平滑 RSI，與 ewm(com=n-1, adjust=False) 結果一致 """
+    size = len(close)
+    out = np.full(size, np.nan)
+    if size == 0: return out
+    alpha = 1.0 / n
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, size):
+        delta = close[i] - close[i - 1]
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        avg_gain = (1 - alpha) * avg_gain + alpha * gain
+        avg_loss = (1 - alpha) * avg_loss + alpha * loss
+        if avg_loss > 0:
+            out[i] = 100 - (100 / (1 + avg_gain / avg_loss))
+        elif avg_gain > 0:
+            out[i] = 100.0
+    return out
 
 # ==========================================
 #  技術指標計算函數庫 
 # ==========================================
 def SMA(values, n):
     """ 簡單移動平均線 """
+    if NUMBA_AVAILABLE:
+        return _sma_loop(np.asarray(values, dtype=np.float64), int(n))
     return pd.Series(values).rolling(n).mean()
 
 def RSI(values, n=14):
     """ 相對強弱指標 """
+    if NUMBA_AVAILABLE:
+        return _rsi_loop(np.asarray(values, dtype=np.float64), int(n))
     close = pd.Series(values)
     delta = close.diff()
     gain = delta.where(delta > 0, 0)
@@ -63,6 +129,14 @@ def DONCHIAN_LOW(low, n=20):
     """ 海龜法則: 過去 N 日的最低價 (不含今日) """
     return pd.Series(low).rolling(n).min().shift(1)
 
+def cross_above(series1, series2):
+    """ 向量化 crossover: series1 由下往上穿越 series2 的 bar 為 True """
+    a = np.asarray(series1, dtype=np.float64)
+    b = np.asarray(series2, dtype=np.float64)
+    out = np.zeros(len(a), dtype=bool)
+    out[1:] = (a[:-1] < b[:-1]) & (a[1:] > b[1:])
+    return out
+
 # ==========================================
 #  通用策略類別
 # ==========================================
@@ -94,6 +168,10 @@ class UniversalStrategy(Strategy):
             self.rsi_entry = self.I(RSI, self.price, self.n_rsi_entry)
             self.rsi_exit = self.I(RSI, self.price, self.n_rsi_exit)
 
+            # 進出場訊號整段預先算好，next() 只需查表
+            self.entry_signal = cross_above(self.sma1, self.sma2) & (np.asarray(self.rsi_entry) < self.rsi_buy_threshold)
+            self.exit_signal = cross_above(self.sma2, self.sma1) | (np.asarray(self.rsi_exit) > self.rsi_sell_threshold)
+
         elif self.mode == "advanced":
             all_configs = self.entry_config + self.exit_config
             for cfg in all_configs:
@@ -214,7 +292,7 @@ class UniversalStrategy(Strategy):
                         if self.data.Close[-1] < l[-2]: return True
 
             except Exception as e:
-                print(f"[Strategy Error] {stype}: {e}")
+                logger.warning("[Strategy Error] %s: %s", stype, e)
                 continue
 
         return False
@@ -300,7 +378,7 @@ class UniversalStrategy(Strategy):
 
             # B. 策略出場訊號檢查
             if self.mode == "basic":
-                if crossover(self.sma2, self.sma1) or self.rsi_exit[-1] > self.rsi_sell_threshold:
+                if self.exit_signal[len(self.data) - 1]:
                     self.position.close()
             elif self.mode == "advanced":
                 if self.check_signal(self.exit_config, is_entry=False):
@@ -315,7 +393,7 @@ class UniversalStrategy(Strategy):
 
             signal = False
             if self.mode == "basic":
-                if crossover(self.sma1, self.sma2) and self.rsi_entry[-1] < self.rsi_buy_threshold:
+                if self.entry_signal[len(self.data) - 1]:
                     signal = True
             elif self.mode == "advanced":
                 if self.check_signal(self.entry_config, is_entry=True):
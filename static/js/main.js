@@ -844,31 +844,34 @@ function renderMainChart(priceData, trades, equityData, bhData, roiData = null)
     const priceLineColor = isDark ? '#334155' : '#cbd5e1';
     const priceAxisColor = isDark ? '#475569' : '#cbd5e1';
 
-    const labels = priceData.map(d => d.time);
+    const labels = priceData.times;
 
     // 資料計算
     // 如果有後端回傳的 ROI Curve (定期定額模式 or Basic)，直接使用
     let strategyReturnData = [];
-    if (roiData && roiData.length > 0) {
-        strategyReturnData = roiData.map(d => d.value);
+    if (roiData && roiData.values.length > 0) {
+        strategyReturnData = roiData.values;
     } else {
-        const initialEquity = equityData.length > 0 ? equityData[0].value : 1;
-        strategyReturnData = equityData.map(d => ((d.value - initialEquity) / initialEquity) * 100);
+        const initialEquity = equityData.values.length > 0 ? equityData.values[0] : 1;
+        strategyReturnData = equityData.values.map(v => ((v - initialEquity) / initialEquity) * 100);
     }
 
-    const initialPrice = priceData.length > 0 ? priceData[0].value : 1;
-    const bhReturnData = priceData.map(d => ((d.value - initialPrice) / initialPrice) * 100);
+    const initialPrice = priceData.values.length > 0 ? priceData.values[0] : 1;
+    const bhReturnData = priceData.values.map(v => ((v - initialPrice) / initialPrice) * 100);
     const tradeMap = {};
-    // 建立查找表，確保買賣點對齊
-    trades.forEach(t => { tradeMap[t.time] = { price: t.price, type: t.type }; });
+    // 建立查找表 (日期 -> {buy: 價格, sell: 價格})，同一日期的買點與賣點都保留
+    trades.forEach(t => {
+        if (!tradeMap[t.time]) tradeMap[t.time] = {};
+        tradeMap[t.time][t.type] = t.price;
+    });
 
     const buyMarkers = labels.map((date, index) => {
         const t = tradeMap[date];
-        return (t && t.type === 'buy') ? strategyReturnData[index] : null;
+        return (t && t.buy !== undefined) ? strategyReturnData[index] : null;
     });
     const sellMarkers = labels.map((date, index) => {
         const t = tradeMap[date];
-        return (t && t.type === 'sell') ? strategyReturnData[index] : null;
+        return (t && t.sell !== undefined) ? strategyReturnData[index] : null;
     });
 
     // --- Datasets 設定 ---
@@ -899,7 +902,7 @@ function renderMainChart(priceData, trades, equityData, bhData, roiData = null)
 
     // --- 股價線 ---
     const priceDataset = {
-        label: '股價 (Price)', data: priceData.map(d => d.value),
+        label: '股價 (Price)', data: priceData.values,
         borderColor: priceLineColor,
         borderWidth: 1,
         pointRadius: 0, tension: 0.1, fill: false,
@@ -955,7 +958,8 @@ function renderMainChart(priceData, trades, equityData, bhData, roiData = null)
                                 const date = context.label;
                                 if (label.includes('鎖定')) return `${label}: ${context.parsed.y.toFixed(2)}%`;
                                 const t = tradeMap[date];
-                                if (t) return `${label}: $${parseFloat(t.price).toFixed(2)} (@ ${context.parsed.y.toFixed(2)}%)`;
+                                const price = t && (label.includes('賣出') ? t.sell : t.buy);
+                                if (price !== undefined) return `${label}: $${parseFloat(price).toFixed(2)} (@ ${context.parsed.y.toFixed(2)}%)`;
                             }
                             if (label) label += ': ';
                             if (context.parsed.y !== null) {
@@ -1091,8 +1095,8 @@ function renderDrawdownChart(data) {
     const gridColor = isDark ? '#334155' : '#e5e7eb';
     const textColor = isDark ? '#94a3b8' : '#64748b';
 
-    const labels = data.map(d => d.time);
-    const values = data.map(d => d.value);
+    const labels = data.times;
+    const values = data.values;
 
     drawdownChart = new Chart(ctx, {
         type: 'line',